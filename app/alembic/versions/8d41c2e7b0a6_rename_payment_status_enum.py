@@ -0,0 +1,32 @@
+"""rename_payment_status_enum
+
+Revision ID: 8d41c2e7b0a6
+Revises: 3b7e1f4a9c52
+Create Date: 2026-10-15 11:37:52.118340
+
+"""
+
+import sqlalchemy as sa
+import sqlmodel
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "8d41c2e7b0a6"
+down_revision = "3b7e1f4a9c52"
+branch_labels = None
+depends_on = None
+
+STATUS_VALUES = ("PENDING", "SUCCEEDED", "FAILED", "CANCELED")
+
+
+def upgrade():
+    # Renaming in place keeps existing rows valid without rewriting the table
+    op.execute("ALTER TYPE paymentstatus RENAME TO payment_status")
+    for value in STATUS_VALUES:
+        op.execute(f"ALTER TYPE payment_status RENAME VALUE '{value}' TO '{value.lower()}'")
+
+
+def downgrade():
+    for value in STATUS_VALUES:
+        op.execute(f"ALTER TYPE payment_status RENAME VALUE '{value.lower()}' TO '{value}'")
+    op.execute("ALTER TYPE payment_status RENAME TO paymentstatus")
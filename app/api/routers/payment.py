@@ -1,19 +1,100 @@
+import asyncio
 import logging
+import uuid
+from decimal import ROUND_HALF_UP, Decimal
+from functools import lru_cache
 
 import httpx
 import stripe
 from auth_lib.auth import CurrentUserUUID
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.cache import TTLCache
 from app.core.config import settings
 from app.core.database import get_async_session
+from app.core.http_client import get_http_client
+from app.core.stripe_client import stripe_client
 from app.models.payment import Payment, PaymentStatus
 from app.schemas.payment import PaymentCreate, StripeCheckoutSession
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+_TIER_CACHE = TTLCache(maxsize=settings.TIER_CACHE_MAXSIZE, ttl=settings.TIER_CACHE_TTL)
+# In-flight tier requests, removed by the fetching task itself once it finishes
+_TIER_FETCHES: dict[uuid.UUID, asyncio.Task] = {}
+
+_SUCCESS_URL = settings.DOMAIN + "?success=true"
+_CANCEL_URL = settings.DOMAIN + "?canceled=true"
+
+
+@lru_cache(maxsize=512)
+def _checkout_line_items(tier_name: str, tier_currency: str, unit_amount: int) -> tuple:
+    """
+    Returns the Stripe Checkout line items for a tier price.
+    The result is shared between requests and must not be mutated.
+    """
+    return (
+        {
+            "price_data": {
+                "currency": tier_currency,
+                "product_data": {
+                    "name": f"Subscription: {tier_name}",  # Display name on Stripe page
+                },
+                "unit_amount": unit_amount,  # Price in cents
+            },
+            "quantity": 1,
+        },
+    )
+
+
+async def _fetch_tier(http_client: httpx.AsyncClient, tier_id: uuid.UUID) -> dict:
+    """
+    Requests tier details from the subscription service and caches them.
+    Falls back to the last known value if the subscription service is unavailable.
+    """
+    try:
+        try:
+            response = await http_client.get(
+                f"{settings.SUBSCRIPTION_SERVICE_URL}tier/tiers/{tier_id}"
+            )
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            stale_data = _TIER_CACHE.get_stale(tier_id)
+            service_unavailable = (
+                not isinstance(e, httpx.HTTPStatusError) or e.response.is_server_error
+            )
+            if stale_data is None or not service_unavailable:
+                raise
+            logger.warning("Serving stale tier details for %s: %s", tier_id, e)
+            return stale_data
+
+        tier_data = response.json()
+        _TIER_CACHE.set(tier_id, tier_data)
+        return tier_data
+    finally:
+        _TIER_FETCHES.pop(tier_id, None)
+
+
+async def fetch_tier_details(http_client: httpx.AsyncClient, tier_id: uuid.UUID) -> dict:
+    """
+    Returns tier details from the subscription service, cached per tier.
+    Concurrent misses for the same tier await a single request and share its result
+    or exception.
+    """
+    tier_data = _TIER_CACHE.get(tier_id)
+    if tier_data is not None:
+        return tier_data
+
+    fetch = _TIER_FETCHES.get(tier_id)
+    if fetch is None:
+        fetch = asyncio.create_task(_fetch_tier(http_client, tier_id))
+        _TIER_FETCHES[tier_id] = fetch
+    # Shielded so a cancelled caller doesn't cancel the fetch for everyone else
+    return await asyncio.shield(fetch)
+
 
 @router.post(
     "/checkout-session",
@@ -26,107 +107,120 @@ async def create_checkout_session(
     payload: PaymentCreate,
     current_user: CurrentUserUUID,
     session: AsyncSession = Depends(get_async_session),
+    http_client: httpx.AsyncClient = Depends(get_http_client),
+    idempotency_key: str | None = Header(None),
 ):
     """
     Creates a Stripe Checkout Session for the given tier ID and authenticated user.
+    Retrying with the same Idempotency-Key header returns the session created first.
     """
-    logger.info(f"User {current_user} requesting checkout session for tier {payload.tier_id}")
-    async with httpx.AsyncClient() as http_client:
-        try:
-            response = await http_client.get(
-                f"{settings.SUBSCRIPTION_SERVICE_URL}tier/tiers/{payload.tier_id}"
-            )
-            response.raise_for_status()
-            tier_data = response.json()
+    logger.info("User %s requesting checkout session for tier %s", current_user, payload.tier_id)
+    try:
+        tier_data = await fetch_tier_details(http_client, payload.tier_id)
 
-            # Extract tier details from response
-            tier_price = tier_data.get("price")
-            tier_currency = tier_data.get("currency", "usd").lower()
-            tier_name = tier_data.get("name")
+        # Extract tier details from response
+        tier_price = tier_data.get("price")
+        tier_currency = tier_data.get("currency", "usd").lower()
+        tier_name = tier_data.get("name")
 
-            logger.info(f"Retrieved tier details: {tier_name} - {tier_price} {tier_currency}")
+        logger.info("Retrieved tier details: %s - %s %s", tier_name, tier_price, tier_currency)
 
-        except Exception as e:
-            logger.exception(f"Failed to fetch tier price for {payload.tier_id}: {e}")
-            raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail=f"Could not retrieve tier details for {payload.tier_id}.",
-            )
+    except Exception as e:
+        logger.exception("Failed to fetch tier price for %s: %s", payload.tier_id, e)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Could not retrieve tier details for {payload.tier_id}.",
+        )
 
     try:
-        unit_amount_in_cents = int(round(tier_price * 100))
+        # Go through the decimal string so e.g. 19.99 becomes exactly 1999 cents
+        unit_amount_in_cents = int(
+            (Decimal(str(tier_price)) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP)
+        )
         logger.info(
-            f"Converted price {tier_price} {tier_currency} to {unit_amount_in_cents} cents."
+            "Converted price %s %s to %s cents.", tier_price, tier_currency, unit_amount_in_cents
         )
     except Exception as e:
-        logger.error(f"Failed to convert price {tier_price} to cents: {e}")
+        logger.error("Failed to convert price %s to cents: %s", tier_price, e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to process tier price.",
         )
 
     try:
-        checkout_session = stripe.checkout.Session.create(
-            client_reference_id=str(current_user),
-            # Payment details
-            line_items=[
-                {
-                    "price_data": {
-                        "currency": tier_currency,
-                        "product_data": {
-                            "name": f"Subscription: {tier_name}",  # Display name on Stripe page
-                        },
-                        "unit_amount": unit_amount_in_cents,  # Price in cents
-                    },
-                    "quantity": 1,
-                }
-            ],
-            mode="payment",
-            success_url=settings.DOMAIN + "?success=true",
-            cancel_url=settings.DOMAIN + "?canceled=true",
-            metadata={
-                "tier_id": str(payload.tier_id),
-                "user_id": str(current_user),
+        checkout_session = await stripe_client.checkout.sessions.create_async(
+            params={
+                "client_reference_id": str(current_user),
+                # Payment details
+                "line_items": _checkout_line_items(tier_name, tier_currency, unit_amount_in_cents),
+                "mode": "payment",
+                "success_url": _SUCCESS_URL,
+                "cancel_url": _CANCEL_URL,
+                "metadata": {
+                    "tier_id": str(payload.tier_id),
+                    "user_id": str(current_user),
+                },
             },
+            # Scoped to the user so keys cannot collide between users
+            options={"idempotency_key": f"{current_user}:{idempotency_key or uuid.uuid4().hex}"},
         )
-        logger.info(f"Stripe Checkout Session created successfully: {checkout_session.id}")
+        logger.info("Stripe Checkout Session created successfully: %s", checkout_session.id)
 
+    except stripe.error.IdempotencyError as e:
+        logger.warning("Idempotency key reused with different checkout parameters: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Idempotency-Key was already used for a different checkout request.",
+        )
     except stripe.error.StripeError as e:
-        logger.error(f"Stripe API error creating checkout session: {e}", exc_info=True)
+        logger.error("Stripe API error creating checkout session: %s", e, exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to create payment session with Stripe: {e}",
         )
     except Exception as e:
-        logger.error(f"Unexpected error creating checkout session: {e}", exc_info=True)
+        logger.error("Unexpected error creating checkout session: %s", e, exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An unexpected error occurred while initiating payment.",
         )
 
-    db_payment = Payment(
-        user_id=current_user,
-        tier_id=payload.tier_id,
-        stripe_checkout_session_id=checkout_session.id,
-        amount=unit_amount_in_cents,
-        currency=tier_currency,
-        status=PaymentStatus.PENDING,
+    # A replayed idempotent request returns an already recorded session, keep that row
+    statement = (
+        insert(Payment)
+        .values(
+            user_id=current_user,
+            tier_id=payload.tier_id,
+            stripe_checkout_session_id=checkout_session.id,
+            amount=unit_amount_in_cents,
+            currency=tier_currency,
+            status=PaymentStatus.PENDING,
+        )
+        .on_conflict_do_nothing(index_elements=["stripe_checkout_session_id"])
+        .returning(Payment)
     )
-    session.add(db_payment)
 
     try:
+        db_payment = (await session.execute(statement)).scalar_one_or_none()
         await session.commit()
-        await session.refresh(db_payment)
-        logger.info(f"Pending payment record created in DB with ID: {db_payment.id}")
     except Exception as e:
         logger.critical(
-            f"Failed to save pending payment record"
-            f" for Stripe session {checkout_session.id} after creation. Error: {e}"
+            "Failed to save pending payment record for Stripe session %s after creation. Error: %s",
+            checkout_session.id,
+            e,
         )
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Payment session initiated but failed to save record. Please contact support.",
         )
+
+    if db_payment:
+        logger.info("Pending payment record created in DB with ID: %s", db_payment.id)
+    else:
+        logger.info(
+            "Payment record for Stripe session %s already exists. Returning it.",
+            checkout_session.id,
+        )
     return StripeCheckoutSession(session_id=checkout_session.id, checkout_url=checkout_session.url)
 
 
@@ -1,26 +1,49 @@
+import asyncio
 import datetime
 import logging
+from dataclasses import dataclass
 
+import orjson
 import stripe
-from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from sqlalchemy import case, lambda_stmt, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlmodel import select
 
+from app.core import stripe_sig
+from app.core.cache import TTLCache
 from app.core.config import settings
-from app.core.database import get_async_session
+from app.core.database import AsyncSessionFactory
 from app.core.kafka_client import kafka_client
+from app.core.webhook_queue import webhook_queue
 from app.models.payment import Payment, PaymentStatus
 from app.schemas.kafka_events import PaymentSucceededEvent
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# IDs of Stripe events already processed by this process, used to drop redeliveries
+_RECEIVED_EVENTS = TTLCache(
+    maxsize=settings.STRIPE_EVENT_DEDUP_MAXSIZE, ttl=settings.STRIPE_EVENT_DEDUP_TTL
+)
+
+_WEBHOOK_SECRET_BYTES = settings.STRIPE_WEBHOOK_SECRET.encode("utf-8")
+
+
+@dataclass(frozen=True, slots=True)
+class CheckoutCompletion:
+    """A paid checkout session waiting to be processed by the webhook queue workers"""
 
-async def verify_stripe_signature(request: Request) -> stripe.Event:
-    """Verify Stripe webhook signature and return the event"""
+    event_id: str
+    checkout_session_id: str
+    payment_intent_id: str
+
+
+async def verify_stripe_signature(request: Request) -> dict:
+    """Verify Stripe webhook signature and return the decoded event payload"""
     payload = await request.body()
     sig_header = request.headers.get("stripe-signature")
-    logger.debug(f"Received Stripe webhook. Signature header present: {bool(sig_header)}")
+    logger.debug("Received Stripe webhook. Signature header present: %s", bool(sig_header))
 
     if not sig_header:
         logger.error("Stripe signature header missing.")
@@ -29,73 +52,108 @@ async def verify_stripe_signature(request: Request) -> stripe.Event:
         )
 
     try:
-        event = stripe.Webhook.construct_event(payload, sig_header, settings.STRIPE_WEBHOOK_SECRET)
+        stripe_sig.verify(payload, sig_header, _WEBHOOK_SECRET_BYTES)
+        # Only a few fields are read, so a plain dict is enough instead of a stripe.Event
+        event = orjson.loads(payload)
         logger.info(
-            f"Stripe webhook signature verified successfully."
-            f" Event ID: {event.id}, Type: {event.type}"
+            "Stripe webhook signature verified successfully. Event ID: %s, Type: %s",
+            event.get("id"),
+            event.get("type"),
         )
         return event
     except ValueError as e:
         # Invalid payload
-        logger.error(f"Invalid Stripe webhook payload: {e}", exc_info=True)
+        logger.error("Invalid Stripe webhook payload: %s", e, exc_info=True)
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid payload")
     except stripe.error.SignatureVerificationError as e:
         # Invalid signature
-        logger.error(f"Invalid Stripe webhook signature: {e}", exc_info=True)
+        logger.error("Invalid Stripe webhook signature: %s", e, exc_info=True)
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid signature")
     except Exception as e:
-        logger.error(f"Unexpected error during webhook signature verification: {e}", exc_info=True)
+        logger.error("Unexpected error during webhook signature verification: %s", e, exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Webhook signature verification error",
         )
 
 
-async def process_successful_payment(
-    session: AsyncSession, checkout_session_id: str, payment_intent_id: str
-) -> Payment | None:
-    """Update payment record for successful checkout"""
-    logger.info(f"Processing successful payment for checkout session: {checkout_session_id}")
-    statement = select(Payment).where(Payment.stripe_checkout_session_id == checkout_session_id)
-    result = await session.execute(statement)
-    db_payment = result.scalar_one_or_none()
-
-    if not db_payment:
-        logger.error(f"Payment record not found for session {checkout_session_id}")
-        return None
-
-    if db_payment.status == PaymentStatus.SUCCEEDED:
-        logger.warning(
-            f"Payment {checkout_session_id} already marked as SUCCEEDED. Skipping update."
+async def process_successful_payments(
+    session: AsyncSession, payment_intents: dict[str, str]
+) -> list[Payment] | None:
+    """
+    Update payment records for a batch of successful checkouts in one transaction.
+    Takes a mapping of checkout session ID to payment intent ID.
+    """
+    logger.info("Processing successful payments for %s checkout sessions", len(payment_intents))
+    # Only PENDING rows are updated, which keeps concurrent deliveries idempotent
+    statement = (
+        update(Payment)
+        .where(
+            Payment.stripe_checkout_session_id.in_(payment_intents),
+            Payment.status == PaymentStatus.PENDING,
         )
-        return db_payment
-
-    if db_payment.status != PaymentStatus.PENDING:
-        logger.error(
-            f"Payment {checkout_session_id} has unexpected status: {db_payment.status}."
-            f" Expected PENDING."
+        .values(
+            status=PaymentStatus.SUCCEEDED,
+            stripe_payment_intent_id=case(
+                payment_intents, value=Payment.stripe_checkout_session_id
+            ),
         )
-        return None
-
+        .returning(Payment)
+    )
     try:
-        db_payment.status = PaymentStatus.SUCCEEDED
-        db_payment.stripe_payment_intent_id = payment_intent_id
-        session.add(db_payment)
+        result = await session.execute(statement, execution_options={"synchronize_session": False})
+        updated = list(result.scalars())
         await session.commit()
-        await session.refresh(db_payment)
-        logger.info(
-            f"Payment record {db_payment.id} updated to SUCCEEDED for session {checkout_session_id}"
-        )
-        return db_payment
     except Exception as e:
-        logger.exception(f"Database error updating payment {db_payment.id} to SUCCEEDED: {e}")
+        logger.exception(
+            "Database error updating %s payments to SUCCEEDED: %s", len(payment_intents), e
+        )
         await session.rollback()
         return None
 
+    if updated:
+        logger.info("%s payment records updated to SUCCEEDED", len(updated))
+
+    updated_ids = {payment.stripe_checkout_session_id for payment in updated}
+    skipped_ids = [sid for sid in payment_intents if sid not in updated_ids]
+    if not skipped_ids:
+        return updated
+
+    # Find out why the remaining sessions were not updated
+    statement = lambda_stmt(
+        lambda: select(Payment).where(Payment.stripe_checkout_session_id.in_(skipped_ids))
+    )
+    try:
+        result = await session.execute(statement)
+        db_payments = {payment.stripe_checkout_session_id: payment for payment in result.scalars()}
+    except Exception as e:
+        # The updates are already committed, their events must still be published
+        logger.exception("Database error looking up %s skipped payments: %s", len(skipped_ids), e)
+        return updated
+
+    processed = []
+    for checkout_session_id in skipped_ids:
+        db_payment = db_payments.get(checkout_session_id)
+
+        if not db_payment:
+            logger.error("Payment record not found for session %s", checkout_session_id)
+        elif db_payment.status == PaymentStatus.SUCCEEDED:
+            logger.warning(
+                "Payment %s already marked as SUCCEEDED. Skipping update.", checkout_session_id
+            )
+            processed.append(db_payment)
+        else:
+            logger.error(
+                "Payment %s has unexpected status: %s. Expected PENDING.",
+                checkout_session_id,
+                db_payment.status,
+            )
+    return updated + processed
+
 
 async def publish_payment_event(payment: Payment) -> bool:
     """Publish payment success event to Kafka"""
-    logger.info(f"Attempting to publish PaymentSucceededEvent for payment {payment.id}")
+    logger.info("Attempting to publish PaymentSucceededEvent for payment %s", payment.id)
     try:
         event = PaymentSucceededEvent(
             payment_id=payment.id,
@@ -107,32 +165,58 @@ async def publish_payment_event(payment: Payment) -> bool:
             stripe_payment_intent_id=payment.stripe_payment_intent_id,
             stripe_checkout_session_id=payment.stripe_checkout_session_id,
         )
-        logger.debug(f"Prepared event data for Kafka: {event.model_dump_json()}")
-
-        success = kafka_client.produce_message(
-            topic=settings.KAFKA_PAYMENT_EVENTS_TOPIC, event=event
-        )
+        success = await kafka_client.produce_message(settings.KAFKA_PAYMENT_EVENTS_TOPIC, event)
 
         if success:
             logger.info(
-                f"Successfully published PaymentSucceededEvent to"
-                f" Kafka topic '{settings.KAFKA_PAYMENT_EVENTS_TOPIC}' for payment {payment.id}."
+                "Successfully published PaymentSucceededEvent to Kafka topic '%s' for payment %s.",
+                settings.KAFKA_PAYMENT_EVENTS_TOPIC,
+                payment.id,
             )
             return True
         else:
             logger.error(
-                f"kafka_client.produce_message returned False for"
-                f" payment {payment.id}. Check Kafka client logs."
+                "Failed to publish PaymentSucceededEvent for payment %s. Check Kafka client logs.",
+                payment.id,
             )
             return False
 
     except Exception as e:
         logger.exception(
-            f"Error creating/publishing Kafka event for payment {payment.id}: {e}", exc_info=True
+            "Error creating/publishing Kafka event for payment %s: %s", payment.id, e, exc_info=True
         )
         return False
 
 
+async def process_checkout_batch(batch: list[CheckoutCompletion]) -> None:
+    """
+    Process a batch of completed checkouts queued by the webhook handler.
+    Raises if the payments could not be updated, so the webhook requests fail and Stripe retries.
+    """
+    payment_intents = {item.checkout_session_id: item.payment_intent_id for item in batch}
+
+    async with AsyncSessionFactory() as session:
+        payments = await process_successful_payments(
+            session=session, payment_intents=payment_intents
+        )
+
+    if payments is None:
+        logger.error(
+            "Failed to process batch of %s payments in database. No Kafka events published.",
+            len(batch),
+        )
+        raise RuntimeError("Failed to update payments in database")
+
+    # Hand all events to the producer first, then wait for their delivery reports together
+    results = await asyncio.gather(*(publish_payment_event(payment) for payment in payments))
+    for payment, published in zip(payments, results, strict=True):
+        if not published:
+            logger.error(
+                "Failed to publish Kafka event for successfully processed payment %s.",
+                payment.id,
+            )
+
+
 @router.post(
     "/stripe",
     summary="Stripe Webhook Handler",
@@ -140,13 +224,12 @@ async def publish_payment_event(payment: Payment) -> bool:
     status_code=status.HTTP_200_OK,
     include_in_schema=False,  # Hide this endpoint from OpenAPI docs
 )
-async def stripe_webhook(
-    request: Request, session: AsyncSession = Depends(get_async_session)
-) -> Response:
+async def stripe_webhook(request: Request) -> Response:
     """
     Handles incoming webhook events from Stripe.
-    Verifies signature, processes relevant events (like checkout completion),
-    updates local database, and publishes events to Kafka.
+    Verifies signature and queues relevant events (like checkout completion)
+    for batched processing, which updates the local database and publishes
+    events to Kafka. Stripe only gets a 200 once the event has been processed.
     """
     logger.info("Received Stripe webhook request.")
 
@@ -154,20 +237,24 @@ async def stripe_webhook(
     try:
         event = await verify_stripe_signature(request)
     except HTTPException as e:
-        logger.error(f"Webhook signature verification failed: {e.detail}")
+        logger.error("Webhook signature verification failed: %s", e.detail)
         raise e
     except Exception as e:
-        logger.exception(f"Unexpected error during signature verification step: {e}")
+        logger.exception("Unexpected error during signature verification step: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Internal server error during signature verification.",
         )
 
     event_type = event.get("type")
-    logger.debug(f"Processing verified event type: {event_type}")
+    logger.debug("Processing verified event type: %s", event_type)
 
     if event_type != "checkout.session.completed":
-        logger.info(f"Received unhandled event type: {event_type}. Acknowledging.")
+        logger.info("Received unhandled event type: %s. Acknowledging.", event_type)
+        return Response(status_code=status.HTTP_200_OK)
+
+    if _RECEIVED_EVENTS.get(event["id"]):
+        logger.info("Stripe event %s was already processed. Skipping.", event["id"])
         return Response(status_code=status.HTTP_200_OK)
 
     session_data = event["data"]["object"]
@@ -176,64 +263,50 @@ async def stripe_webhook(
     payment_intent_id = session_data.get("payment_intent")
 
     logger.info(
-        f"Handling checkout.session.completed for session {checkout_session_id}."
-        f" Payment status: {payment_status}"
+        "Handling checkout.session.completed for session %s. Payment status: %s",
+        checkout_session_id,
+        payment_status,
     )
 
     if payment_status != "paid":
         logger.warning(
-            f"Checkout session {checkout_session_id} completed but payment"
-            f" status is '{payment_status}'. No action taken."
+            "Checkout session %s completed but payment status is '%s'. No action taken.",
+            checkout_session_id,
+            payment_status,
         )
         return Response(status_code=status.HTTP_200_OK)
 
     if not payment_intent_id:
         logger.error(
-            f"Checkout session {checkout_session_id} is paid but missing 'payment_intent'."
-            " Cannot proceed."
+            "Checkout session %s is paid but missing 'payment_intent'. Cannot proceed.",
+            checkout_session_id,
         )
         return Response(
             status_code=status.HTTP_400_BAD_REQUEST,
             content="Missing payment intent in webhook data.",
         )
 
-    payment = None
-    try:
-        logger.debug(
-            f"Attempting to process successful payment for"
-            f" session {checkout_session_id} in database."
-        )
-        payment = await process_successful_payment(
-            session=session,
-            checkout_session_id=checkout_session_id,
-            payment_intent_id=payment_intent_id,
+    completion = CheckoutCompletion(
+        event_id=event["id"],
+        checkout_session_id=checkout_session_id,
+        payment_intent_id=payment_intent_id,
+    )
+    processed = webhook_queue.enqueue(completion)
+    if processed is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Webhook queue is full. Please retry later.",
         )
 
-        if payment:
-            logger.debug(
-                f"Database update successful for payment {payment.id}."
-                f" Attempting to publish Kafka event."
-            )
-            published = await publish_payment_event(payment)
-            if not published:
-                logger.error(
-                    f"Failed to publish Kafka event for"
-                    f" successfully processed payment {payment.id}."
-                )
-        else:
-            logger.error(
-                f"Failed to process payment in database for session {checkout_session_id}."
-                f" No Kafka event published."
-            )
-
+    logger.info("Queued checkout session %s for processing.", checkout_session_id)
+    try:
+        await processed
     except Exception as e:
-        logger.exception(
-            f"Unhandled error processing payment for session {checkout_session_id}: {e}"
-        )
+        logger.error("Failed to process checkout session %s: %s", checkout_session_id, e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Internal server error processing payment completion.",
+            detail="Failed to process checkout completion. Please retry later.",
         )
 
-    logger.info(f"Successfully processed webhook for checkout session {checkout_session_id}.")
+    _RECEIVED_EVENTS.set(event["id"], True)
     return Response(status_code=status.HTTP_200_OK)
@@ -1,7 +1,8 @@
 import os
+from functools import lru_cache
 from typing import Any
 
-from pydantic import HttpUrl, PostgresDsn, field_validator
+from pydantic import HttpUrl, field_validator
 from pydantic_core import MultiHostUrl
 from pydantic_core.core_schema import ValidationInfo
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -21,22 +22,50 @@ class Settings(BaseSettings):
     POSTGRES_USER: str
     POSTGRES_PASSWORD: str
     POSTGRES_DB: str
+    # Per worker process: WEB_CONCURRENCY x (pool size + overflow) must stay below the
+    # server's max_connections (100 on a stock PostgreSQL), 4 x 20 = 80 by default
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_WARMUP: int = 2  # connections opened per worker at startup, capped at DB_POOL_SIZE
+    DB_POOL_RECYCLE: int = 1800  # seconds
+    DB_POOL_PRE_PING: bool = False
+    DB_QUERY_CACHE_SIZE: int = 2000
 
     # Stripe Config
     STRIPE_SECRET_KEY: str
     STRIPE_PUBLISHABLE_KEY: str
     STRIPE_WEBHOOK_SECRET: str
+    STRIPE_EVENT_DEDUP_TTL: int = 86400  # seconds
+    STRIPE_EVENT_DEDUP_MAXSIZE: int = 100_000
+    STRIPE_TIMEOUT: float = 10.0  # seconds
+    STRIPE_MAX_NETWORK_RETRIES: int = 2
+
+    # Webhook Queue Config
+    WEBHOOK_QUEUE_MAXSIZE: int = 10_000
+    WEBHOOK_WORKERS: int = 4
+    WEBHOOK_BATCH_SIZE: int = 50
+    WEBHOOK_BATCH_TIMEOUT_MS: int = 50
 
     # Kafka Config
     KAFKA_BOOTSTRAP_SERVERS: str = "kafka:9092"
     KAFKA_PAYMENT_EVENTS_TOPIC: str = "payment_events"
     KAFKA_CLIENT_ID: str = "payment_service_producer"
+    KAFKA_DELIVERY_TIMEOUT: float = 5.0  # seconds
+    # Higher linger batches more events per request but delays every delivery confirmation
+    KAFKA_LINGER_MS: int = 5
+    KAFKA_BATCH_SIZE: int = 65536  # bytes
+    KAFKA_COMPRESSION_TYPE: str = "lz4"
 
     # Service URLs
     SUBSCRIPTION_SERVICE_URL: HttpUrl = "http://subscription_service:8003"
     FRONTEND_URL: HttpUrl = "http://localhost:3000"
 
-    SQLALCHEMY_DATABASE_URI: PostgresDsn | None = None
+    # Tier details cache
+    TIER_CACHE_TTL: int = 300  # seconds
+    TIER_CACHE_MAXSIZE: int = 1024
+
+    # Assembled once into a plain string, consumers don't need a URL object
+    SQLALCHEMY_DATABASE_URI: str | None = None
 
     @field_validator("SQLALCHEMY_DATABASE_URI", mode="before")
     @classmethod
@@ -44,14 +73,22 @@ class Settings(BaseSettings):
         if isinstance(v, str):
             return v
         values = info.data
-        return MultiHostUrl.build(
-            scheme="postgresql+asyncpg",
-            username=values.get("POSTGRES_USER"),
-            password=values.get("POSTGRES_PASSWORD"),
-            host=values.get("POSTGRES_SERVER"),
-            port=values.get("POSTGRES_PORT"),
-            path=f"{values.get('POSTGRES_DB') or ''}",
+        return str(
+            MultiHostUrl.build(
+                scheme="postgresql+asyncpg",
+                username=values.get("POSTGRES_USER"),
+                password=values.get("POSTGRES_PASSWORD"),
+                host=values.get("POSTGRES_SERVER"),
+                port=values.get("POSTGRES_PORT"),
+                path=f"{values.get('POSTGRES_DB') or ''}",
+            )
         )
 
 
-settings = Settings()
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Returns the application settings, reading the environment and .env only once."""
+    return Settings()
+
+
+settings = get_settings()
@@ -0,0 +1,7 @@
+import httpx
+from fastapi import Request
+
+
+def get_http_client(request: Request) -> httpx.AsyncClient:
+    """FastAPI dependency for the shared outbound HTTP client."""
+    return request.app.state.http_client
@@ -0,0 +1,17 @@
+import os
+import time
+import uuid
+
+
+def uuid7() -> uuid.UUID:
+    """
+    Generates a time-ordered UUID version 7 (RFC 9562).
+    The leading 48 bits are the Unix time in milliseconds, so new primary keys
+    land on the rightmost B-tree page instead of scattering across the index.
+    """
+    unix_ts_ms = time.time_ns() // 1_000_000
+    value = (unix_ts_ms & 0xFFFF_FFFF_FFFF) << 80 | int.from_bytes(os.urandom(10))
+    # Set the version (0b0111) and variant (0b10) bits
+    value = (value & ~(0xF << 76)) | (0x7 << 76)
+    value = (value & ~(0x3 << 62)) | (0x2 << 62)
+    return uuid.UUID(int=value)
@@ -1,6 +1,10 @@
+import asyncio
 import logging
+import os
+from functools import lru_cache
 
 from confluent_kafka import KafkaException, Producer
+from pydantic import TypeAdapter
 from sqlmodel import SQLModel
 
 from app.core.config import settings
@@ -8,9 +12,16 @@ from app.core.config import settings
 logger = logging.getLogger(__name__)
 
 
+@lru_cache(maxsize=32)
+def _event_adapter(event_type: type[SQLModel]) -> TypeAdapter:
+    """Returns a TypeAdapter for the event class, built once per class."""
+    return TypeAdapter(event_type)
+
+
 class KafkaClient:
     def __init__(self):
         self._producer: Producer | None = None
+        self._poll_task: asyncio.Task | None = None
 
     def acked(self, err, msg):
         """
@@ -18,11 +29,13 @@ class KafkaClient:
         Triggered by poll() or flush().
         """
         if err is not None:
-            logger.error(f"Failed to deliver message: {err}")
+            logger.error("Failed to deliver message: %s", err)
         else:
             logger.info(
-                f"Message produced: '{msg.topic()}' "
-                f"[Partition {msg.partition()}] @ Offset {msg.offset()}"
+                "Message produced: '%s' [Partition %s] @ Offset %s",
+                msg.topic(),
+                msg.partition(),
+                msg.offset(),
             )
 
     def init_producer(self):
@@ -31,28 +44,49 @@ class KafkaClient:
         """
         conf = {
             "bootstrap.servers": settings.KAFKA_BOOTSTRAP_SERVERS,
-            "client.id": settings.KAFKA_CLIENT_ID,
+            # Each uvicorn worker runs its own producer, tell them apart in broker metrics
+            "client.id": f"{settings.KAFKA_CLIENT_ID}-{os.getpid()}",
             "acks": "all",
             "retries": 3,
             "retry.backoff.ms": 1000,
             "enable.idempotence": True,
+            "max.in.flight.requests.per.connection": 5,
+            # Batch small JSON events into fewer, compressed requests
+            "linger.ms": settings.KAFKA_LINGER_MS,
+            "batch.size": settings.KAFKA_BATCH_SIZE,
+            "compression.type": settings.KAFKA_COMPRESSION_TYPE,
+            "queue.buffering.max.messages": 200000,
+            # Bound per-worker buffer memory and keep batches on one partition longer
+            "queue.buffering.max.kbytes": 32768,
+            "sticky.partitioning.linger.ms": 10,
+            "socket.nagle.disable": True,
         }
         try:
             self._producer = Producer(conf)
+            self._poll_task = asyncio.create_task(self._poll_forever())
             logger.info(
-                f"Kafka producer initialized successfully."
-                f" Brokers: {settings.KAFKA_BOOTSTRAP_SERVERS}"
+                "Kafka producer initialized successfully. Brokers: %s",
+                settings.KAFKA_BOOTSTRAP_SERVERS,
             )
         except KafkaException as e:
-            logger.exception(f"CRITICAL: Failed to initialize Kafka producer: {e}", exc_info=True)
+            logger.exception("CRITICAL: Failed to initialize Kafka producer: %s", e, exc_info=True)
             self._producer = None
         except Exception as e:
             logger.exception(
-                f"An unexpected error occurred during Kafka producer initialization: {e}",
+                "An unexpected error occurred during Kafka producer initialization: %s",
+                e,
                 exc_info=True,
             )
             self._producer = None
 
+    async def _poll_forever(self):
+        """
+        Serves delivery callbacks in the background instead of polling after every produce.
+        """
+        while True:
+            self._producer.poll(0)
+            await asyncio.sleep(0.05)
+
     def close_producer(self):
         """
         Flushes any buffered messages and closes the Kafka Producer.
@@ -61,63 +95,100 @@ class KafkaClient:
         if not self._producer:
             return
 
+        if self._poll_task:
+            self._poll_task.cancel()
+            self._poll_task = None
+
         logger.info("Flushing Kafka producer...")
         try:
             remaining_messages = self._producer.flush(timeout=10)
             if remaining_messages > 0:
                 logger.warning(
-                    f"Kafka producer flush timed out, {remaining_messages}"
-                    f" messages may not have been sent."
+                    "Kafka producer flush timed out, %s messages may not have been sent.",
+                    remaining_messages,
                 )
             else:
                 logger.info("Kafka producer flushed successfully.")
         except Exception as e:
-            logger.exception(f"Error flushing Kafka producer: {e}", exc_info=True)
+            logger.exception("Error flushing Kafka producer: %s", e, exc_info=True)
+
+    @staticmethod
+    def _resolve_delivery(delivered: asyncio.Future, success: bool):
+        if not delivered.done():
+            delivered.set_result(success)
 
-    def produce_message(self, topic: str, event: SQLModel):
+    async def produce_message(self, topic: str, event: SQLModel) -> bool:
         """
-        Produces (sends) a Pydantic event model to the specified Kafka topic.
+        Produces (sends) a Pydantic event model to the specified Kafka topic
+        and waits for the broker to confirm delivery.
 
         Args:
             topic (str): The Kafka topic to send the message to.
             event (BaseModel): The Pydantic model instance representing the event.
+
+        Returns:
+            bool: True if the message was delivered, False otherwise.
+        """
+        try:
+            # Serialize straight to bytes, skipping the str round trip of model_dump_json()
+            message_bytes = _event_adapter(type(event)).dump_json(event)
+        except Exception as e:
+            logger.error("Failed to serialize event for Kafka: %s", e, exc_info=True)
+            return False
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Prepared event data for Kafka: %s", message_bytes.decode("utf-8"))
+
+        key_bytes = None
+        if hasattr(event, "user_id") and event.user_id:
+            try:
+                key_bytes = str(event.user_id).encode("utf-8")
+            except AttributeError:
+                logger.warning(
+                    "Event model has user_id but couldn't convert to string for Kafka key."
+                )
+
+        return await self._produce(topic=topic, value=message_bytes, key=key_bytes)
+
+    async def _produce(self, topic: str, value: bytes, key: bytes | None = None) -> bool:
+        """
+        Sends serialized message bytes to the topic and waits for the broker to confirm delivery.
         """
         if not self._producer:
             logger.error("Kafka producer not initialized")
             return False
 
         try:
-            message_bytes = event.model_dump_json().encode("utf-8")
-
-            key_bytes = None
-            if hasattr(event, "user_id") and event.user_id:
-                try:
-                    key_bytes = str(event.user_id).encode("utf-8")
-                except AttributeError:
-                    logger.warning(
-                        "Event model has user_id but couldn't convert to string for Kafka key."
-                    )
-
-            self._producer.produce(
-                topic=topic, value=message_bytes, key=key_bytes, callback=self.acked
-            )
+            loop = asyncio.get_running_loop()
+            delivered = loop.create_future()
 
-            self._producer.poll(0)
+            def on_delivery(err, msg):
+                self.acked(err, msg)
+                loop.call_soon_threadsafe(self._resolve_delivery, delivered, err is None)
+
+            self._producer.produce(topic=topic, value=value, key=key, callback=on_delivery)
 
             logger.info(
-                f"Message produced to Kafka topic '{topic}'."
-                f" Key: {key_bytes.decode('utf-8') if key_bytes else 'None'}"
+                "Message produced to Kafka topic '%s'. Key: %s",
+                topic,
+                key.decode("utf-8") if key else "None",
             )
-            return True
+            return await asyncio.wait_for(delivered, timeout=settings.KAFKA_DELIVERY_TIMEOUT)
 
+        except TimeoutError:
+            logger.error(
+                "Timed out after %ss waiting for delivery to Kafka topic '%s'.",
+                settings.KAFKA_DELIVERY_TIMEOUT,
+                topic,
+            )
+            return False
         except BufferError as e:
-            logger.error(f"Kafka producer queue is full: {e}", exc_info=True)
+            logger.error("Kafka producer queue is full: %s", e, exc_info=True)
             return False
         except KafkaException as e:
-            logger.error(f"KafkaException while producing message: {e}", exc_info=True)
+            logger.error("KafkaException while producing message: %s", e, exc_info=True)
             return False
         except Exception as e:
-            logger.error(f"Unexpected error producing message to Kafka: {e}", exc_info=True)
+            logger.error("Unexpected error producing message to Kafka: %s", e, exc_info=True)
             return False
 
 
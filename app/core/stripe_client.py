@@ -0,0 +1,11 @@
+import stripe
+
+from app.core.config import settings
+
+# Shared Stripe client, built once at import. The HTTPX-backed HTTP client provides
+# the *_async API methods. Retries are safe since checkout calls send an idempotency key.
+stripe_client = stripe.StripeClient(
+    settings.STRIPE_SECRET_KEY,
+    max_network_retries=settings.STRIPE_MAX_NETWORK_RETRIES,
+    http_client=stripe.HTTPXClient(timeout=settings.STRIPE_TIMEOUT),
+)
@@ -0,0 +1,58 @@
+import hashlib
+import hmac
+import time
+from functools import lru_cache
+
+import stripe
+
+DEFAULT_TOLERANCE = 300  # seconds
+EXPECTED_SCHEME = "v1"
+
+
+@lru_cache(maxsize=4)
+def _hmac_seed(secret_bytes: bytes) -> "hmac.HMAC":
+    """Returns an HMAC keyed with the secret, copied for every signature check."""
+    return hmac.new(secret_bytes, digestmod=hashlib.sha256)
+
+
+def verify(
+    payload: bytes, sig_header: str, secret_bytes: bytes, tolerance: int = DEFAULT_TOLERANCE
+) -> None:
+    """
+    Verifies a Stripe-Signature header against the raw webhook payload.
+    Raises stripe.error.SignatureVerificationError if the signature is not valid.
+    """
+    timestamp = None
+    signatures = []
+    for item in sig_header.split(","):
+        scheme, _, value = item.partition("=")
+        if scheme == "t":
+            timestamp = value
+        elif scheme == EXPECTED_SCHEME:
+            signatures.append(value)
+
+    try:
+        timestamp = int(timestamp)
+    except (TypeError, ValueError):
+        raise stripe.error.SignatureVerificationError(
+            "Unable to extract timestamp and signatures from header", sig_header, payload
+        )
+
+    if not signatures:
+        raise stripe.error.SignatureVerificationError(
+            f"No signatures found with expected scheme {EXPECTED_SCHEME}", sig_header, payload
+        )
+
+    mac = _hmac_seed(secret_bytes).copy()
+    mac.update(b"%d." % timestamp)
+    mac.update(payload)
+    expected_signature = mac.hexdigest()
+    if not any(hmac.compare_digest(expected_signature, s) for s in signatures):
+        raise stripe.error.SignatureVerificationError(
+            "No signatures found matching the expected signature for payload", sig_header, payload
+        )
+
+    if tolerance and timestamp < time.time() - tolerance:
+        raise stripe.error.SignatureVerificationError(
+            f"Timestamp outside the tolerance zone ({timestamp})", sig_header, payload
+        )
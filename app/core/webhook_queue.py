@@ -0,0 +1,122 @@
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookQueue:
+    def __init__(self):
+        self._queue: asyncio.Queue | None = None
+        self._workers: list[asyncio.Task] = []
+        self._handler: Callable[[list[Any]], Awaitable[None]] | None = None
+
+    def start(self, handler: Callable[[list[Any]], Awaitable[None]]):
+        """
+        Creates the bounded queue and spawns the worker tasks that drain it.
+        Must be called from a running event loop (application startup).
+        """
+        self._queue = asyncio.Queue(maxsize=settings.WEBHOOK_QUEUE_MAXSIZE)
+        self._handler = handler
+        self._workers = [
+            asyncio.create_task(self._run(), name=f"webhook-worker-{i}")
+            for i in range(settings.WEBHOOK_WORKERS)
+        ]
+        logger.info("Webhook queue started with %s workers.", settings.WEBHOOK_WORKERS)
+
+    def enqueue(self, item: Any) -> asyncio.Future | None:
+        """
+        Adds an item to the queue without waiting.
+        Returns a future that resolves once the item's batch has been handled, or raises
+        the handler's exception, or None if the queue is not started or is full.
+        """
+        if not self._queue:
+            logger.error("Webhook queue not started")
+            return None
+
+        done = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((item, done))
+            return done
+        except asyncio.QueueFull:
+            logger.warning("Webhook queue is full (%s items).", self._queue.qsize())
+            return None
+
+    async def close(self):
+        """
+        Waits for queued items to be processed, then stops the workers.
+        Should be called on application shutdown.
+        """
+        if not self._queue:
+            return
+
+        logger.info("Draining webhook queue (%s items)...", self._queue.qsize())
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=10)
+            logger.info("Webhook queue drained successfully.")
+        except TimeoutError:
+            logger.warning(
+                "Webhook queue drain timed out with %s items still queued.", self._queue.qsize()
+            )
+
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+        # Items that were never handled are failed, not dropped, so their callers can report it
+        while not self._queue.empty():
+            _, done = self._queue.get_nowait()
+            self._resolve(done, RuntimeError("Webhook queue closed"))
+            self._queue.task_done()
+
+    @staticmethod
+    def _resolve(done: asyncio.Future, error: BaseException | None = None):
+        if done.done():
+            return
+        if error is None:
+            done.set_result(None)
+        else:
+            done.set_exception(error)
+
+    async def _next_batch(self) -> list[Any]:
+        """
+        Waits for the first item, then collects more until the batch is full
+        or the batch timeout has elapsed.
+        """
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + settings.WEBHOOK_BATCH_TIMEOUT_MS / 1000
+
+        while len(batch) < settings.WEBHOOK_BATCH_SIZE:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            error = None
+            try:
+                await self._handler([item for item, _ in batch])
+            except asyncio.CancelledError:
+                error = RuntimeError("Webhook queue closed")
+                raise
+            except Exception as e:
+                logger.exception("Error processing webhook batch of %s items: %s", len(batch), e)
+                error = e
+            finally:
+                for _, done in batch:
+                    self._resolve(done, error)
+                    self._queue.task_done()
+
+
+webhook_queue = WebhookQueue()
@@ -2,20 +2,26 @@ import logging
 from contextlib import asynccontextmanager
 from importlib.metadata import PackageNotFoundError, version
 
-import stripe
+import httpx
 from fastapi import Depends, FastAPI, HTTPException
-from sqlalchemy import select
+from fastapi.responses import ORJSONResponse, Response
+from sqlalchemy import lambda_stmt, select, text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.routers.payment import router as payment_router
+from app.api.routers.webhooks import process_checkout_batch
 from app.api.routers.webhooks import router as webhooks_router
+from app.core.config import settings
+from app.core.database import async_engine, get_async_session, warm_up_pool
+from app.core.kafka_client import kafka_client
+from app.core.log_config import configure_logging
+from app.core.webhook_queue import webhook_queue
 from app.models.payment import Payment
 
-from .core.config import settings
-from .core.database import async_engine, get_async_session
-from .core.kafka_client import kafka_client
-
-logging.basicConfig(level=logging.INFO if settings.APP_ENV == "production" else logging.DEBUG)
+configure_logging(
+    level=logging.INFO if settings.APP_ENV == "production" else logging.DEBUG,
+    json=settings.APP_ENV == "production",
+)
 logger = logging.getLogger(__name__)
 
 try:
@@ -23,23 +29,28 @@ try:
 except PackageNotFoundError:
     __version__ = "0.0.0"
 
+# Probe bodies are serialized once. A new Response is still built per request,
+# since middleware may add headers to it.
+_HEALTH_BODY = b'{"status":"ok","service":"Payment Service"}'
+_DB_OK_BODY = b'{"status":"ok"}'
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Application startup...")
-    # You can add startup logic here, like checking DB connection
+    # Check the database and open the pool's connections before serving traffic
     try:
-        async with async_engine.connect():
-            logger.info("Database connection successful during startup.")
+        await warm_up_pool()
+        logger.info("Database connection successful during startup.")
     except Exception as e:
-        logger.error(f"Database connection failed during startup: {e}")
+        logger.error("Database connection failed during startup: %s", e)
 
-    # Initialize Stripe API Key
-    try:
-        stripe.api_key = settings.STRIPE_SECRET_KEY
-        logger.info("Stripe API key configured successfully during startup.")
-    except Exception:
-        logger.exception("CRITICAL: Failed to configure Stripe API key on startup.", exc_info=True)
+    # Initialize shared HTTP client for calls to other services
+    app.state.http_client = httpx.AsyncClient(
+        timeout=httpx.Timeout(5.0),
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+    )
+    logger.info("Shared HTTP client initialized.")
 
     # Inittialize Kafka Producer
     logger.info("Initializing Kafka producer...")
@@ -48,15 +59,26 @@ async def lifespan(app: FastAPI):
         logger.info("Kafka Producer initialized successfully during startup.")
     except Exception as e:
         logger.exception(
-            f"An unexpected error occurred during Kafka producer initialization: {e}", exc_info=True
+            "An unexpected error occurred during Kafka producer initialization: %s",
+            e,
+            exc_info=True,
         )
         raise RuntimeError("Kafka producer initialization failed") from e
 
+    # Start background processing of Stripe webhook events
+    webhook_queue.start(process_checkout_batch)
+
     yield
     logger.info("Application shutdown...")
+    await webhook_queue.close()
+    logger.info("Webhook queue closed.")
+
     await async_engine.dispose()
     logger.info("Database engine disposed.")
 
+    await app.state.http_client.aclose()
+    logger.info("Shared HTTP client closed.")
+
     logger.info("Close Kafka Producer")
     kafka_client.close_producer()
     logger.info("Shutdown complete.")
@@ -67,6 +89,7 @@ app = FastAPI(
     description="Handles user transactions.",
     version=__version__,
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 app.include_router(webhooks_router, prefix="/webhooks", tags=["WebhookPayment"])
@@ -75,40 +98,55 @@ app.include_router(payment_router, prefix="/payment", tags=["Payment"])
 
 
 @app.get("/test-db/", summary="Test Database Connection", tags=["Test"])
-async def test_db_connection(session: AsyncSession = Depends(get_async_session)):
+async def test_db_connection(
+    deep: bool = False, session: AsyncSession = Depends(get_async_session)
+):
     """
-    Attempts to retrieve the first payment_ID from the database.
+    Checks that the database answers a trivial query.
+    With ?deep=1, attempts to retrieve the first payment_ID from the database instead.
     """
     logger.info("Accessing /test-db/ endpoint")
     try:
-        statement = select(Payment).limit(1)
+        if not deep:
+            await session.execute(text("SELECT 1"))
+            return Response(content=_DB_OK_BODY, media_type="application/json")
+
+        statement = lambda_stmt(lambda: select(Payment).limit(1))
         result = await session.execute(statement)
         payment = result.scalar_one_or_none()
 
         if payment:
-            logger.info(f"Successfully retrieved payment_ID: {payment.id}")
+            logger.info("Successfully retrieved payment_ID: %s", payment.id)
             return {"status": "success", "first_payment_ID": payment.id}
         else:
             logger.info("No payment_ID found in the database.")
             return {"status": "success", "message": "No payment_ID found"}
     except Exception as e:
-        logger.error(f"Database query failed: {e}", exc_info=True)
+        logger.error("Database query failed: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=f"Database error: {e}")
 
 
 @app.get("/", summary="Health Check", tags=["Health"])
 async def health_check():
     """Basic health check endpoint."""
-    return {"status": "ok", "service": "Payment Service"}
+    return Response(content=_HEALTH_BODY, media_type="application/json")
 
 
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run(
-        "app.main:app",
-        host="0.0.0.0",
-        port=8004,
-        reload=(settings.APP_ENV == "development"),
-        log_level="info",
-    )
+    if settings.APP_ENV == "development":
+        # Single process with auto-reload, on the default event loop and HTTP parser
+        uvicorn.run("app.main:app", host="0.0.0.0", port=8004, reload=True, log_level="info")
+    else:
+        # Reload and multiple workers are mutually exclusive, production takes the workers.
+        # uvicorn reads the worker count from WEB_CONCURRENCY, as in the Dockerfile
+        uvicorn.run(
+            "app.main:app",
+            host="0.0.0.0",
+            port=8004,
+            loop="uvloop",
+            http="httptools",
+            log_level="info",
+            access_log=False,
+        )
@@ -2,9 +2,15 @@ import datetime
 import enum
 import uuid
 
-from sqlalchemy import Column, DateTime, Enum, func
+from sqlalchemy import Column, DateTime, Enum, Index, text
 from sqlmodel import Field, SQLModel
 
+from app.core.ids import uuid7
+
+
+def utc_now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.UTC)
+
 
 class PaymentStatus(enum.Enum):
     PENDING = "pending"
@@ -18,31 +24,45 @@ class PaymentBase(SQLModel):
 
 
 class Payment(PaymentBase, table=True):
+    __table_args__ = (
+        Index("ix_payment_user_status", "user_id", "status"),
+        Index(
+            "ix_payment_intent",
+            "stripe_payment_intent_id",
+            postgresql_where=text("stripe_payment_intent_id IS NOT NULL"),
+        ),
+    )
+
     id: uuid.UUID = Field(
-        default_factory=uuid.uuid4,
+        default_factory=uuid7,
         primary_key=True,
         index=True,
         nullable=False,
     )
-    user_id: uuid.UUID = Field(index=True, nullable=False)
+    user_id: uuid.UUID = Field(nullable=False)
     subscription_id: uuid.UUID | None = Field(index=True, default=None, nullable=True)
     tier_id: uuid.UUID = Field(index=True, nullable=False)
     stripe_checkout_session_id: str = Field(index=True, unique=True, nullable=False)
-    stripe_payment_intent_id: str | None = Field(index=True, default=None, nullable=True)
+    stripe_payment_intent_id: str | None = Field(default=None, nullable=True)
     amount: int = Field(ge=0, nullable=False)  # Store cents
     currency: str = Field(default="usd", nullable=False, max_length=3)
     status: PaymentStatus = Field(
         sa_column=Column(
-            Enum(PaymentStatus),
+            Enum(
+                PaymentStatus,
+                name="payment_status",
+                native_enum=True,
+                # Store the enum values ('pending'), not the member names
+                values_callable=lambda e: [member.value for member in e],
+                validate_strings=True,
+            ),
             nullable=False,
-            index=True,
         )
     )
+    # Timestamps are computed client-side, the database doesn't have to generate them
     created_at: datetime.datetime = Field(
-        sa_column=Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+        sa_column=Column(DateTime(timezone=True), nullable=False, default=utc_now)
     )
     updated_at: datetime.datetime = Field(
-        sa_column=Column(
-            DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now()
-        )
+        sa_column=Column(DateTime(timezone=True), nullable=False, default=utc_now, onupdate=utc_now)
     )
@@ -1,17 +1,21 @@
 import uuid
 from datetime import datetime
 
-from pydantic import HttpUrl
+from pydantic import ConfigDict, HttpUrl
 from sqlmodel import SQLModel
 
 from app.models.payment import PaymentBase, PaymentStatus
 
 
 class PaymentCreate(PaymentBase):
+    model_config = ConfigDict(frozen=True)
+
     tier_id: uuid.UUID
 
 
 class PaymentRead(PaymentBase):
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
     id: uuid.UUID
     user_id: uuid.UUID
     subscription_id: uuid.UUID | None
@@ -26,5 +30,7 @@ class PaymentRead(PaymentBase):
 
 
 class StripeCheckoutSession(SQLModel):
+    model_config = ConfigDict(frozen=True)
+
     session_id: str
     checkout_url: HttpUrl
@@ -0,0 +1,80 @@
+import hashlib
+import hmac
+import time
+
+import pytest
+import stripe
+
+from app.core import stripe_sig
+
+SECRET = b"whsec_test_secret"
+PAYLOAD = b'{"id": "evt_test", "type": "checkout.session.completed"}'
+
+
+def sign(payload: bytes, timestamp: int, secret: bytes = SECRET) -> str:
+    return hmac.new(secret, b"%d." % timestamp + payload, hashlib.sha256).hexdigest()
+
+
+def test_valid_header():
+    timestamp = int(time.time())
+    header = f"t={timestamp},v1={sign(PAYLOAD, timestamp)}"
+
+    stripe_sig.verify(PAYLOAD, header, SECRET)
+    # Matches stripe-python's own check
+    stripe.WebhookSignature.verify_header(PAYLOAD.decode(), header, SECRET.decode(), 300)
+
+
+def test_multiple_v1_signatures_any_match():
+    timestamp = int(time.time())
+    header = (
+        f"t={timestamp},v1={sign(PAYLOAD, timestamp, b'whsec_old_secret')},"
+        f"v1={sign(PAYLOAD, timestamp)},v0=ignored"
+    )
+
+    stripe_sig.verify(PAYLOAD, header, SECRET)
+
+
+def test_bad_signature():
+    timestamp = int(time.time())
+    header = f"t={timestamp},v1={sign(PAYLOAD, timestamp, b'whsec_other_secret')}"
+
+    with pytest.raises(stripe.error.SignatureVerificationError, match="expected signature"):
+        stripe_sig.verify(PAYLOAD, header, SECRET)
+
+
+def test_tampered_payload():
+    timestamp = int(time.time())
+    header = f"t={timestamp},v1={sign(PAYLOAD, timestamp)}"
+
+    with pytest.raises(stripe.error.SignatureVerificationError, match="expected signature"):
+        stripe_sig.verify(PAYLOAD + b" ", header, SECRET)
+
+
+def test_missing_timestamp():
+    header = f"v1={sign(PAYLOAD, int(time.time()))}"
+
+    with pytest.raises(stripe.error.SignatureVerificationError, match="timestamp"):
+        stripe_sig.verify(PAYLOAD, header, SECRET)
+
+
+def test_missing_v1_signature():
+    timestamp = int(time.time())
+    header = f"t={timestamp},v0={sign(PAYLOAD, timestamp)}"
+
+    with pytest.raises(stripe.error.SignatureVerificationError, match="expected scheme v1"):
+        stripe_sig.verify(PAYLOAD, header, SECRET)
+
+
+def test_timestamp_outside_tolerance():
+    timestamp = int(time.time()) - stripe_sig.DEFAULT_TOLERANCE - 60
+    header = f"t={timestamp},v1={sign(PAYLOAD, timestamp)}"
+
+    with pytest.raises(stripe.error.SignatureVerificationError, match="tolerance"):
+        stripe_sig.verify(PAYLOAD, header, SECRET)
+
+
+def test_non_integer_timestamp():
+    header = f"t=not-a-number,v1={sign(PAYLOAD, int(time.time()))}"
+
+    with pytest.raises(stripe.error.SignatureVerificationError, match="timestamp"):
+        stripe_sig.verify(PAYLOAD, header, SECRET)